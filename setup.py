@@ -34,7 +34,8 @@ setup(
     ],
     extras_require={
         'elmo': ['allennlp'],
-        'bpe': ['subword-nmt']
+        'bpe': ['subword-nmt'],
+        'test': ['pytest', 'numba']
     },
     entry_points={
         'console_scripts': [
@@ -9,6 +9,12 @@ from torch.autograd import Function
 from supar.utils.common import MIN
 from supar.utils.fn import pad
 
+try:
+    import triton
+    import triton.language as tl
+except ImportError:
+    triton = None
+
 
 def tarjan(sequence: Iterable[int]) -> Iterable[int]:
     r"""
@@ -375,6 +381,70 @@ class Sparsemax(Function):
         return grad, None
 
 
+if triton is not None:
+
+    @triton.jit
+    def cky_logsum_step_kernel(
+        x_ptr, y_ptr, z_ptr, out_ptr,
+        m, batch_size,
+        x_s0, x_s1, x_s2,
+        y_s0, y_s1, y_s2,
+        z_s0, z_s1,
+        BLOCK_M: tl.constexpr, BLOCK_B: tl.constexpr
+    ):
+        i = tl.program_id(0)
+        b = tl.program_id(1) * BLOCK_B + tl.arange(0, BLOCK_B)
+        b_mask = b < batch_size
+        # streaming logsumexp over the split axis, subtracting the running max for stability
+        acc_max = tl.full((BLOCK_B,), float('-inf'), tl.float32)
+        acc_sum = tl.zeros((BLOCK_B,), tl.float32)
+        for k in range(0, m, BLOCK_M):
+            ks = k + tl.arange(0, BLOCK_M)
+            k_mask = ks < m
+            mask = k_mask[:, None] & b_mask[None, :]
+            x = tl.load(x_ptr + i * x_s0 + ks[:, None] * x_s1 + b[None, :] * x_s2, mask=mask, other=float('-inf'))
+            y = tl.load(y_ptr + i * y_s0 + ks[:, None] * y_s1 + b[None, :] * y_s2, mask=mask, other=float('-inf'))
+            # accumulate in fp32 regardless of the storage dtype of the chart
+            s = x.to(tl.float32) + y.to(tl.float32)
+            new_max = tl.maximum(acc_max, tl.max(s, 0))
+            acc_sum = acc_sum * tl.exp(acc_max - new_max) + tl.sum(tl.exp(s - new_max[None, :]), 0)
+            acc_max = new_max
+        out = tl.log(acc_sum) + acc_max + tl.load(z_ptr + i * z_s0 + b * z_s1, mask=b_mask, other=0.)
+        tl.store(out_ptr + i * batch_size + b, out, mask=b_mask)
+
+
+class CKYLogsumStep(Function):
+
+    r"""
+    One width step of the CKY inside recursion in the log space,
+    i.e., :math:`out_{i} = \mathrm{logsumexp}_k (x_{ik} + y_{ik}) + z_i`, fused into a single Triton kernel.
+    The two stripes of the chart are streamed tile by tile so that only the active diagonal is materialized.
+    Available on CUDA devices with `triton` installed only.
+    """
+
+    @staticmethod
+    @torch.cuda.amp.custom_fwd(cast_inputs=torch.float)
+    def forward(ctx, x: torch.Tensor, y: torch.Tensor, z: torch.Tensor) -> torch.Tensor:
+        n, m, batch_size = x.shape
+        out = x.new_empty(n, batch_size)
+        grid = (n, triton.cdiv(batch_size, 64))
+        cky_logsum_step_kernel[grid](x, y, z, out,
+                                     m, batch_size,
+                                     *x.stride(), *y.stride(), *z.stride(),
+                                     BLOCK_M=16, BLOCK_B=64)
+        # the stripes are views of the chart under construction, so save frozen copies for backward
+        ctx.save_for_backward(x.detach().clone(), y.detach().clone(), z, out)
+        return out
+
+    @staticmethod
+    @torch.cuda.amp.custom_bwd
+    def backward(ctx, g: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        x, y, z, out = ctx.saved_tensors
+        # out - z restores the plain logsumexp, whose softmax weights the incoming gradient
+        grad = g.unsqueeze(1) * (x + y - (out - z).unsqueeze(1)).exp()
+        return grad, grad, g
+
+
 logsumexp = Logsumexp.apply
 
 logaddexp = Logaddexp.apply
@@ -382,3 +452,5 @@ logaddexp = Logaddexp.apply
 sampled_logsumexp = SampledLogsumexp.apply
 
 sparsemax = Sparsemax.apply
+
+cky_logsum_step = CKYLogsumStep.apply if triton is not None else None
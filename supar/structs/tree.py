@@ -4,15 +4,244 @@ from __future__ import annotations
 
 from typing import List, Optional, Tuple, Union
 
+import numpy as np
 import torch
+import torch.autograd as autograd
 import torch.nn as nn
 from supar.structs.dist import StructuredDistribution
-from supar.structs.fn import mst
-from supar.structs.semiring import LogSemiring, Semiring
+from supar.structs.fn import cky_logsum_step, mst
+from supar.structs.semiring import LogSemiring, MaxSemiring, Semiring
 from supar.utils.fn import diagonal_stripe, expanded_stripe, stripe
 from torch.distributions.utils import lazy_property
 
 
+# templates of the upper-triangular chart pattern, which depend on the shape only,
+# cached per (device, seq_len) to avoid one [batch_size, seq_len, seq_len] allocation per construction
+_TRIU_CACHE = {}
+
+
+def _triu_mask(seq_len: int, device: torch.device) -> torch.BoolTensor:
+    key = (device, seq_len)
+    mask = _TRIU_CACHE.get(key)
+    if mask is None:
+        mask = _TRIU_CACHE[key] = torch.ones(seq_len, seq_len, dtype=torch.bool, device=device).triu_(1)
+    return mask
+
+
+def _batched_nonzero(x: torch.Tensor) -> List[List[List[int]]]:
+    r"""
+    Collects the indices of all nonzero chart entries with a single ``nonzero`` call
+    and a single device-to-host sync, then splits them by batch on the host side.
+
+    Args:
+        x (~torch.Tensor): ``[batch_size, seq_len, seq_len, ...]``.
+
+    Returns:
+        The per-sentence lists of nonzero indices, with the batch dim stripped.
+    """
+
+    idx = x.nonzero().cpu().numpy()
+    return [i.tolist() for i in np.split(idx[:, 1:], np.searchsorted(idx[:, 0], range(1, len(x))))]
+
+
+# per-(device, seq_len) tables mapping a span width to the start of its diagonal
+# in the packed chart, i.e., offsets[w] = (w - 1) * seq_len - w * (w - 1) / 2
+_OFFSET_CACHE = {}
+
+
+def _diag_offsets(seq_len: int, device: torch.device) -> torch.LongTensor:
+    key = (device, seq_len)
+    offsets = _OFFSET_CACHE.get(key)
+    if offsets is None:
+        w = torch.arange(seq_len, device=device)
+        offsets = _OFFSET_CACHE[key] = ((w - 1) * seq_len - w * (w - 1) // 2).clamp_(0)
+    return offsets
+
+
+def _pack_diagonals(scores: torch.Tensor, seq_len: int) -> torch.Tensor:
+    # [n_cells, batch_size], the upper triangle of the chart in diagonal-major order
+    return torch.cat([scores.diagonal(w).movedim(-1, 0) for w in range(1, seq_len)])
+
+
+def _small_logsumexp(x: torch.Tensor) -> torch.Tensor:
+    # `torch.logsumexp` runs a max pass, a subtraction and an exp over the whole input;
+    # for the handful of split points of short spans a chain of elementwise
+    # `logaddexp` ops, each stable on its own, is cheaper than the three-pass reduction
+    if len(x) > 8:
+        return torch.logsumexp(x, 0)
+    s, *rest = x.unbind(0)
+    for t in rest:
+        s = torch.logaddexp(s, t)
+    return s
+
+
+def _inside_log(scores: torch.Tensor, seq_len: int) -> torch.Tensor:
+    r"""
+    Inside recursion specialized on :class:`~supar.structs.semiring.LogSemiring`,
+    with `torch.logsumexp` inlined in place of the virtual semiring dispatch
+    so that the whole loop body can be captured by `torch.compile`.
+    The chart is packed in diagonal-major order, storing the upper triangle only
+    and thus halving the memory footprint of the square layout.
+
+    Args:
+        scores (~torch.Tensor): ``[seq_len, seq_len, batch_size]``.
+        seq_len (int): the length of the chart.
+
+    Returns:
+        The packed chart of inside scores, indexable via :func:`_diag_offsets`.
+    """
+
+    offsets = _diag_offsets(seq_len, scores.device)
+    scores = _pack_diagonals(scores, seq_len)
+    s = torch.full_like(scores, LogSemiring.zero)
+    s[:seq_len-1] = scores[:seq_len-1]
+    for w in range(2, seq_len):
+        n, o = seq_len - w, (w - 1) * seq_len - w * (w - 1) // 2
+        i = torch.arange(n, device=s.device)
+        k = torch.arange(1, w, device=s.device).unsqueeze(1)
+        # [w-1, n, batch_size]
+        x = s[offsets[k] + i] + s[offsets[w - k] + k + i]
+        # the reduction always runs in fp32 so that half-precision charts stay numerically safe
+        s[o:o+n] = _small_logsumexp(x.float()).to(s.dtype) + scores[o:o+n]
+    return s
+
+
+def _inside_max(scores: torch.Tensor, seq_len: int) -> torch.Tensor:
+    r"""
+    Inside recursion specialized on :class:`~supar.structs.semiring.MaxSemiring`,
+    the Viterbi mirror of :func:`_inside_log` over the same packed chart.
+
+    Args:
+        scores (~torch.Tensor): ``[seq_len, seq_len, batch_size]``.
+        seq_len (int): the length of the chart.
+
+    Returns:
+        The packed chart of max scores, indexable via :func:`_diag_offsets`.
+    """
+
+    offsets = _diag_offsets(seq_len, scores.device)
+    scores = _pack_diagonals(scores, seq_len)
+    s = torch.full_like(scores, MaxSemiring.zero)
+    s[:seq_len-1] = scores[:seq_len-1]
+    for w in range(2, seq_len):
+        n, o = seq_len - w, (w - 1) * seq_len - w * (w - 1) // 2
+        i = torch.arange(n, device=s.device)
+        k = torch.arange(1, w, device=s.device).unsqueeze(1)
+        # [w-1, n, batch_size]
+        x = s[offsets[k] + i] + s[offsets[w - k] + k + i]
+        s[o:o+n] = x.max(0)[0] + scores[o:o+n]
+    return s
+
+
+@torch.no_grad()
+def _inside_max_backpointers(scores: torch.Tensor, seq_len: int) -> Tuple[torch.Tensor, torch.LongTensor]:
+    r"""
+    Forward-only Viterbi recursion over the packed chart that records the best split
+    of each span, so that the 1-best tree can be recovered by a plain traversal
+    without retaining any autograd graph.
+
+    Args:
+        scores (~torch.Tensor): ``[seq_len, seq_len, batch_size]``.
+        seq_len (int): the length of the chart.
+
+    Returns:
+        The packed chart of max scores and the packed table of back pointers,
+        where ``bp[cell]`` holds the width of the best left child of the span.
+    """
+
+    offsets = _diag_offsets(seq_len, scores.device)
+    scores = _pack_diagonals(scores, seq_len)
+    s = torch.full_like(scores, MaxSemiring.zero)
+    s[:seq_len-1] = scores[:seq_len-1]
+    bp = torch.zeros_like(scores, dtype=torch.long)
+    for w in range(2, seq_len):
+        n, o = seq_len - w, (w - 1) * seq_len - w * (w - 1) // 2
+        i = torch.arange(n, device=s.device)
+        k = torch.arange(1, w, device=s.device).unsqueeze(1)
+        # [n, batch_size]
+        s_s, k_s = (s[offsets[k] + i] + s[offsets[w - k] + k + i]).max(0)
+        s[o:o+n] = s_s + scores[o:o+n]
+        bp[o:o+n] = k_s + 1
+    return s, bp
+
+
+def _inside_log_triton(scores: torch.Tensor, seq_len: int) -> torch.Tensor:
+    r"""
+    CUDA variant of :func:`_inside_log` where each width step is fused into a single Triton kernel
+    that reads the two stripes of the chart and writes the active diagonal directly.
+    """
+
+    s = torch.full_like(scores, LogSemiring.zero)
+    s.diagonal(1).copy_(scores.diagonal(1))
+    for w in range(2, seq_len):
+        n = seq_len - w
+        # [n, batch_size]
+        s_s = cky_logsum_step(stripe(s, n, w-1, (0, 1)), stripe(s, n, w-1, (1, w), False),
+                              scores.diagonal(w).movedim(-1, 0))
+        s.diagonal(w).copy_(s_s.movedim(0, -1))
+    return s
+
+
+def _pad_to_bucket(scores: torch.Tensor, seq_len: int, value: float) -> Tuple[torch.Tensor, int]:
+    r"""
+    Pads a ``[seq_len, seq_len, batch_size]`` chart of scores up to the next power of two
+    with the semiring zero, so that the compile and CUDA-graph caches are keyed on a handful
+    of bucketed shapes rather than on every distinct sentence length.
+    Padded cells only feed spans reaching past the true chart and never affect real ones.
+    """
+
+    bucket = 1 << (seq_len - 1).bit_length()
+    if bucket == seq_len:
+        return scores, seq_len
+    return nn.functional.pad(scores, (0, 0, 0, bucket - seq_len, 0, bucket - seq_len), value=value), bucket
+
+
+# graphed inside passes keyed by (device, chart shape):
+# the recursion has no data-dependent control flow, so for a fixed shape the whole O(seq_len)
+# sequence of kernel launches can be captured once as a CUDA graph and replayed afterwards
+_graph_cache = {}
+
+
+def _inside_log_cuda(scores: torch.Tensor, seq_len: int) -> torch.Tensor:
+    # each captured graph pins its static input/chart/grad buffers for the life of the process,
+    # so the batch dim is bucketed to powers of two like the chart dims to bound the cache
+    batch_size = scores.shape[-1]
+    bucket = 1 << (batch_size - 1).bit_length()
+    if bucket != batch_size:
+        scores = nn.functional.pad(scores, (0, bucket - batch_size), value=LogSemiring.zero)
+    key = (scores.device, tuple(scores.shape))
+    inside = _graph_cache.get(key)
+    if inside is None:
+        try:
+            inside = torch.cuda.make_graphed_callables(lambda x: _inside_log_triton(x, seq_len),
+                                                       (scores.detach().clone().requires_grad_(),))
+        except Exception:
+            # graph capture is best-effort; fall back to launching the kernels each call
+            inside = (lambda x: _inside_log_triton(x, seq_len))
+        _graph_cache[key] = inside
+    return inside(scores)
+
+
+# compiled lazily upon the first call and memoized afterwards;
+# `dynamic=False` specializes the graph on each distinct chart shape
+_compiled_inside_log = None
+
+
+def _inside_log_dispatch(scores: torch.Tensor, seq_len: int) -> torch.Tensor:
+    global _compiled_inside_log
+    if _compiled_inside_log is None:
+        try:
+            _compiled_inside_log = torch.compile(_inside_log, dynamic=False)
+        except (AttributeError, RuntimeError):
+            _compiled_inside_log = _inside_log
+    try:
+        return _compiled_inside_log(scores, seq_len)
+    except Exception:
+        # fall back to the eager path permanently if compilation is unsupported
+        _compiled_inside_log = _inside_log
+        return _inside_log(scores, seq_len)
+
+
 class ConstituencyCRF(StructuredDistribution):
     r"""
     Constituency TreeCRF :cite:`zhang-etal-2020-fast,stern-etal-2017-minimal`.
@@ -22,6 +251,14 @@ class ConstituencyCRF(StructuredDistribution):
             Scores of all constituents.
         lens (~torch.LongTensor): ``[batch_size]``.
             Sentence lengths for masking.
+        dtype (Optional[torch.dtype]):
+            If specified, e.g., ``torch.bfloat16``, the inside chart is stored in this dtype
+            to halve its memory traffic, while reductions still accumulate in fp32.
+            Default: ``None``, i.e., the dtype of `scores`.
+
+    The `mask` attribute is read-only: on full-length batches it is a broadcast view of
+    a triangular template cached per device and shared across instances,
+    so clone it before any in-place modification.
 
     Examples:
         >>> from supar import ConstituencyCRF
@@ -58,34 +295,77 @@ class ConstituencyCRF(StructuredDistribution):
         self,
         scores: torch.Tensor,
         lens: Optional[torch.LongTensor] = None,
-        label: bool = False
+        label: bool = False,
+        dtype: Optional[torch.dtype] = None
     ) -> ConstituencyCRF:
         super().__init__(scores)
 
         batch_size, seq_len, *_ = scores.shape
         self.lens = scores.new_full((batch_size,), seq_len-1).long() if lens is None else lens
-        self.mask = (self.lens.unsqueeze(-1) + 1).gt(self.lens.new_tensor(range(seq_len)))
-        self.mask = self.mask.unsqueeze(1) & scores.new_ones(scores.shape[:3]).bool().triu_(1)
+        if lens is None or bool(self.lens.eq(seq_len - 1).all()):
+            # all sentences span the full chart, common at eval time,
+            # so the cached triangular template can be broadcast as is;
+            # the resulting mask aliases the shared template and must never be written in place
+            self.mask = _triu_mask(seq_len, scores.device).unsqueeze(0).expand(batch_size, -1, -1)
+        else:
+            self.mask = (self.lens.unsqueeze(-1) + 1).gt(torch.arange(seq_len, device=scores.device))
+            self.mask = self.mask.unsqueeze(1) & _triu_mask(seq_len, scores.device)
         self.label = label
+        self.dtype = dtype
 
     def __repr__(self):
         return f"{self.__class__.__name__}(label={self.label})"
 
     def __add__(self, other):
-        return ConstituencyCRF(torch.stack((self.scores, other.scores), -1), self.lens, self.label)
+        return ConstituencyCRF(torch.stack((self.scores, other.scores), -1), self.lens, self.label, self.dtype)
 
     @lazy_property
     def argmax(self):
-        return [torch.nonzero(i).tolist() for i in self.backward(self.max.sum())]
+        # recover the best trees from explicit back pointers rather than by differentiating
+        # through the Viterbi pass, so no autograd graph is built or retained for decoding
+        with torch.no_grad():
+            seq_len = self.scores.shape[1]
+            scores = self.scores.movedim((1, 2), (0, 1))
+            if self.label:
+                scores, labels = scores.max(-1)
+                labels = labels.cpu().numpy()
+            _, bp = _inside_max_backpointers(scores, seq_len)
+            bp = bp.cpu().numpy()
+        preds = []
+        for t, length in enumerate(self.lens.tolist()):
+            spans, stack = [], [(0, length)]
+            while stack:
+                i, j = stack.pop()
+                spans.append([i, j, int(labels[i, j, t])] if self.label else [i, j])
+                w = j - i
+                if w > 1:
+                    k = int(bp[(w - 1) * seq_len - w * (w - 1) // 2 + i, t])
+                    stack.extend(((i, i + k), (i + k, j)))
+            preds.append(sorted(spans))
+        return preds
 
     def topk(self, k: int) -> List[List[Tuple]]:
-        return list(zip(*[[torch.nonzero(j).tolist() for j in self.backward(i)] for i in self.kmax(k).sum(0)]))
+        batch_size, scores = len(self.lens), self.kmax(k).sum(0)
+        try:
+            # one vmapped backward over the k objectives instead of k full passes
+            grads = autograd.grad(scores, self.scores,
+                                  torch.eye(k, dtype=scores.dtype, device=scores.device),
+                                  create_graph=True, is_grads_batched=True)[0]
+        except RuntimeError:
+            # some backward ops lack batching rules; fall back to sequential passes
+            grads = torch.stack([self.backward(i) for i in scores])
+        # [k, batch_size, ...] indicator charts, collected with a single nonzero and sync
+        # over the flattened rank/batch dims, then regrouped by rank on the host side
+        spans = _batched_nonzero(grads.flatten(0, 1))
+        return list(zip(*[spans[i:i+batch_size] for i in range(0, k * batch_size, batch_size)]))
 
     def score(self, value: torch.LongTensor) -> torch.Tensor:
         mask = self.mask & value.ge(0)
         if self.label:
-            scores = self.scores[mask].gather(-1, value[mask].unsqueeze(-1)).squeeze(-1)
-            scores = torch.full_like(mask, LogSemiring.one, dtype=scores.dtype).masked_scatter_(mask, scores)
+            # gather the scores of gold labels and mask out invalid positions with a fused `where`,
+            # avoiding the full-chart allocation and scatter of a `masked_scatter_` round-trip
+            scores = self.scores.gather(-1, value.clamp_min(0).unsqueeze(-1)).squeeze(-1)
+            scores = torch.where(mask, scores, LogSemiring.one)
         else:
             scores = LogSemiring.one_mask(self.scores, ~mask)
         return LogSemiring.prod(LogSemiring.prod(scores, -1), -1)
@@ -96,6 +376,23 @@ class ConstituencyCRF(StructuredDistribution):
         # [seq_len, seq_len, batch_size, ...], (l->r)
         scores = semiring.convert(self.scores.movedim((1, 2), (0, 1)))
         scores = semiring.sum(scores, 3) if self.label else scores
+        if self.dtype is not None and (semiring is LogSemiring or semiring is MaxSemiring):
+            scores = scores.to(self.dtype)
+        if semiring is LogSemiring:
+            # both cached paths below specialize on the chart shape, so sentence lengths
+            # are bucketed to powers of two to keep the number of specializations small
+            scores, seq_len = _pad_to_bucket(scores, seq_len, semiring.zero)
+            if cky_logsum_step is not None and scores.is_cuda:
+                # the Triton per-step kernels, replayed as a per-shape CUDA graph once captured
+                s = _inside_log_cuda(scores, seq_len)
+                return semiring.unconvert(s)[0][self.lens, range(batch_size)]
+            # the whole recursion over the packed chart is captured by `torch.compile`
+            s = _inside_log_dispatch(scores, seq_len)
+            return s[_diag_offsets(seq_len, s.device)[self.lens], range(batch_size)]
+        if semiring is MaxSemiring:
+            s = _inside_max(scores, seq_len)
+            return s[_diag_offsets(seq_len, s.device)[self.lens], range(batch_size)]
+
         s = semiring.zeros_like(scores)
         s.diagonal(1).copy_(scores.diagonal(1))
 
@@ -113,6 +113,51 @@ def kmeans(x: List[int], k: int, max_it: int = 32) -> Tuple[List[float], List[Li
     return centroids, clusters
 
 
+# C++ implementations of the stripe helpers, calling `at::as_strided` directly to return
+# zero-copy views without the Python-side size/stride arithmetic that the CKY driver pays O(L) times
+_STRIPE_CPP = r"""
+#include <torch/extension.h>
+
+torch::Tensor stripe(const torch::Tensor& x, int64_t n, int64_t w,
+                     int64_t offset0, int64_t offset1, bool horizontal) {
+  auto t = x.contiguous();
+  int64_t seq_len = t.size(1);
+  auto stride = t.strides();
+  int64_t numel = stride[1];
+  std::vector<int64_t> sizes = {n, w};
+  sizes.insert(sizes.end(), t.sizes().begin() + 2, t.sizes().end());
+  std::vector<int64_t> strides = {(seq_len + 1) * numel, (horizontal ? 1 : seq_len) * numel};
+  strides.insert(strides.end(), stride.begin() + 2, stride.end());
+  return t.as_strided(sizes, strides, (offset0 * seq_len + offset1) * numel);
+}
+
+torch::Tensor expanded_stripe(const torch::Tensor& x, int64_t n, int64_t w,
+                              int64_t offset0, int64_t offset1) {
+  auto t = x.contiguous();
+  auto stride = t.strides();
+  std::vector<int64_t> sizes = {n, w};
+  sizes.insert(sizes.end(), t.sizes().begin() + 1, t.sizes().end());
+  std::vector<int64_t> strides = {stride[0], stride[0]};
+  strides.insert(strides.end(), stride.begin() + 1, stride.end());
+  return t.as_strided(sizes, strides, offset1 * stride[0]);
+}
+"""
+
+# compiled lazily upon the first call; `False` marks an unavailable toolchain
+_stripe_ext = None
+
+
+def _load_stripe_ext():
+    global _stripe_ext
+    if _stripe_ext is None:
+        try:
+            from torch.utils.cpp_extension import load_inline
+            _stripe_ext = load_inline('stripe_cpp', cpp_sources=_STRIPE_CPP, functions=['stripe', 'expanded_stripe'])
+        except Exception:
+            _stripe_ext = False
+    return _stripe_ext
+
+
 def stripe(x: torch.Tensor, n: int, w: int, offset: Tuple = (0, 0), horizontal: bool = True) -> torch.Tensor:
     r"""
     Returns a parallelogram stripe of the tensor.
@@ -146,6 +191,9 @@ def stripe(x: torch.Tensor, n: int, w: int, offset: Tuple = (0, 0), horizontal:
                 [12, 17, 22]])
     """
 
+    ext = _load_stripe_ext()
+    if ext:
+        return ext.stripe(x, n, w, offset[0], offset[1], bool(horizontal))
     x = x.contiguous()
     seq_len, stride = x.size(1), list(x.stride())
     numel = stride[1]
@@ -229,6 +277,9 @@ def expanded_stripe(x: torch.Tensor, n: int, w: int, offset: Tuple = (0, 0)) ->
                  [20, 21, 22, 23, 24]]])
 
     """
+    ext = _load_stripe_ext()
+    if ext:
+        return ext.expanded_stripe(x, n, w, offset[0], offset[1])
     x = x.contiguous()
     stride = list(x.stride())
     return x.as_strided(size=(n, w, *list(x.shape[1:])),
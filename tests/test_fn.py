@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
-from supar.structs.fn import tarjan
+import pytest
+import torch
+from supar.structs.fn import cky_logsum_step, tarjan
 
 
 def test_tarjan():
@@ -14,3 +16,18 @@ def test_tarjan():
             assert next(tarjan(sequence), None) == answer
         else:
             assert list(tarjan(sequence)) == answer
+
+
+@pytest.mark.skipif(cky_logsum_step is None or not torch.cuda.is_available(), reason='requires CUDA and triton')
+def test_cky_logsum_step():
+    torch.manual_seed(1)
+    n, m, batch_size = 5, 7, 4
+    for _ in range(5):
+        x = torch.randn(n, m, batch_size, device='cuda:0').requires_grad_()
+        y = torch.randn(n, m, batch_size, device='cuda:0').requires_grad_()
+        z = torch.randn(n, batch_size, device='cuda:0').requires_grad_()
+        out, ref = cky_logsum_step(x, y, z), torch.logsumexp(x + y, 1) + z
+        assert out.allclose(ref)
+        g = torch.randn_like(out)
+        for i, j in zip(torch.autograd.grad(out, (x, y, z), g), torch.autograd.grad(ref, (x, y, z), g)):
+            assert i.allclose(j, atol=1e-6)
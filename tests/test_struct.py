@@ -1,13 +1,54 @@
 # -*- coding: utf-8 -*-
 
-import itertools
-
+import numpy as np
+import pytest
 import torch
 from supar.structs import (ConstituencyCRF)
 from supar.structs.semiring import LogSemiring, MaxSemiring, Semiring
 from torch.distributions.distribution import Distribution
 from torch.distributions.utils import lazy_property
 
+numba = pytest.importorskip('numba')
+
+
+@numba.njit(cache=True)
+def cell_index(i: int, j: int, length: int) -> int:
+    # cells are laid out in width-major order, i.e., all spans of width w precede those of width w+1
+    w = j - i
+    return (w - 1) * length - (w - 1) * (w - 2) // 2 + i
+
+
+@numba.njit(cache=True)
+def enumerate_spans(length: int) -> np.ndarray:
+    r"""
+    Enumerates the spans of all binary derivations over a sequence bottom-up.
+    A derivation over a span of width w always consists of exactly 2w-1 spans,
+    so all derivations of the full sequence fit in one ``[n_derivations, 2 * length - 1, 2]`` array.
+    """
+
+    derivs = [np.empty((0, 0, 2), dtype=np.int64)][:0]
+    for w in range(1, length + 1):
+        for i in range(length - w + 1):
+            j = i + w
+            if w == 1:
+                d = np.empty((1, 1, 2), dtype=np.int64)
+                d[0, 0, 0], d[0, 0, 1] = i, j
+            else:
+                total = 0
+                for k in range(i + 1, j):
+                    total += len(derivs[cell_index(i, k, length)]) * len(derivs[cell_index(k, j, length)])
+                d = np.empty((total, 2 * w - 1, 2), dtype=np.int64)
+                t = 0
+                for k in range(i + 1, j):
+                    for ld in derivs[cell_index(i, k, length)]:
+                        for rd in derivs[cell_index(k, j, length)]:
+                            d[t, 0, 0], d[t, 0, 1] = i, j
+                            d[t, 1:len(ld)+1] = ld
+                            d[t, len(ld)+1:] = rd
+                            t += 1
+            derivs.append(d)
+    return derivs[cell_index(0, length, length)]
+
 
 class BruteForceStructuredDistribution(Distribution):
 
@@ -67,15 +108,18 @@ class BruteForceConstituencyCRF(BruteForceStructuredDistribution):
     def enumerate(self, semiring):
         scores = self.scores if self.label else self.scores.unsqueeze(-1)
 
-        def enumerate(s, i, j):
-            if i + 1 == j:
-                yield from s[i, j].unbind(-1)
-            for k in range(i + 1, j):
-                for t1 in enumerate(s, i, k):
-                    for t2 in enumerate(s, k, j):
-                        for t in s[i, j].unbind(-1):
-                            yield semiring.times(t, t1, t2)
-        return [torch.stack([i for i in enumerate(s, 0, length)]) for s, length in zip(scores, self.lens)]
+        structs = []
+        for s, length in zip(scores, self.lens.tolist()):
+            # [n_derivations, 2 * length - 1, 2]
+            spans = torch.from_numpy(enumerate_spans(length)).to(s.device)
+            # [n_derivations, 2 * length - 1, n_labels]
+            s_span = s[spans[..., 0], spans[..., 1]]
+            # accumulate `semiring.times` over all label assignments of each derivation
+            seqs = s_span[:, 0]
+            for i in range(1, s_span.shape[1]):
+                seqs = semiring.mul(seqs.unsqueeze(-1), s_span[:, i].unsqueeze(-2)).flatten(-2)
+            structs.append(seqs.flatten())
+        return structs
 
 
 